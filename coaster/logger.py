@@ -7,53 +7,104 @@ Coaster can help your application log errors at run-time. Initialize with
 this is done automatically for you.
 """
 
-from datetime import datetime, timedelta
-from html import escape
+from functools import lru_cache
+from inspect import CO_OPTIMIZED
 from io import StringIO
-from pprint import pprint
-from threading import Lock
-from typing import Any, Dict
+from itertools import islice
+from pprint import PrettyPrinter
+from typing import Any, Dict, Tuple
 import logging
 import logging.handlers
 import re
-import textwrap
+import time
 import traceback
 
 from flask import g, request, session
 from flask.config import Config
 
+from requests.adapters import HTTPAdapter
 import requests
 
 from .auth import current_auth
 
-# Regex for credit card numbers
+try:
+    # google-re2 matches in linear time without backtracking. It is optional, and
+    # is only used for the keyword regex, which matches the same in both engines
+    import re2 as _re_engine
+except ImportError:
+    _re_engine = re
+
+# Regex for credit card numbers, and the shortest string it can match. This always
+# uses stdlib re, as RE2's \d and \b are ASCII-only while re's are Unicode-aware
 _card_re = re.compile(r'\b(?:\d[ -]*?){13,16}\b')
+_card_min_length = 13
 
 # These keywords are borrowed from Sentry's documentation and expanded for PII
-_filter_re = re.compile(
-    '''
-    (password
-    |secret
-    |passwd
-    |api_key
-    |apikey
-    |access_token
-    |auth_token
-    |_token
-    |token_
-    |credentials
-    |mysql_pwd
-    |stripetoken
-    |cardnumber
-    |email
-    |phone)
-    ''',
-    re.IGNORECASE | re.VERBOSE,
+_filter_keywords = (
+    'password',
+    'secret',
+    'passwd',
+    'api_key',
+    'apikey',
+    'access_token',
+    'auth_token',
+    '_token',
+    'token_',
+    'credentials',
+    'mysql_pwd',
+    'stripetoken',
+    'cardnumber',
+    'email',
+    'phone',
 )
+# Keywords are lowercase ASCII, and are matched against lowercased keys
+_filter_re = _re_engine.compile('(' + '|'.join(_filter_keywords) + ')')
+
+try:
+    # pyahocorasick matches all keywords in a single pass over the key. It is
+    # optional, and the regex above is used if it is not installed
+    import ahocorasick
+except ImportError:
+    _filter_automaton = None
+else:
+    _filter_automaton = ahocorasick.Automaton()
+    for _keyword in _filter_keywords:
+        _filter_automaton.add_word(_keyword, _keyword)
+    _filter_automaton.make_automaton()
+
+try:
+    # orjson is faster at encoding the multi-KB Slack payloads. It is optional
+    import orjson  # type: ignore[import]
+
+    _json_dumps = orjson.dumps
+except ImportError:
+    import json
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+
+# Section separators in :class:`LocalVarFormatter` output, for Slack attachments.
+# Trying ten dashes before four matches splitting on ten, then splitting on four
+_slack_section_re = re.compile('-{10}|-{4}')
+
+# Equivalent to ``html.escape(text, quote=False)``, but in a single pass
+_html_escape_table = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+# Shared HTTP session for Slack and Telegram, so reports reuse open connections
+# instead of a new TCP and TLS handshake each time. Retries are disabled and a
+# timeout of (connect, read) seconds is used so reporting can't stall the app
+_http = requests.Session()
+for _prefix in ('https://hooks.slack.com/', 'https://api.telegram.org/'):
+    _http.mount(_prefix, HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0))
+_http_timeout = (2, 5)
+
+# Minimum interval in seconds between reports from the same line of code
+error_throttle_interval = 300.0
 
-# global var as lazy in-memory cache
-error_throttle_timestamp_slack: Dict[str, datetime] = {}
-error_throttle_timestamp_telegram: Dict[str, datetime] = {}
+# global var as lazy in-memory cache, of (module, line) to monotonic clock seconds
+error_throttle_timestamp_slack: Dict[Tuple[str, int], float] = {}
+error_throttle_timestamp_telegram: Dict[Tuple[str, int], float] = {}
 
 
 class FilteredValueIndicator:
@@ -86,32 +137,92 @@ class RepeatValueIndicator:
     __str__ = __repr__
 
 
+@lru_cache(maxsize=4096)
+def _is_sensitive_key(key: str) -> bool:
+    """Check if a key name suggests a sensitive value (cached as names repeat)."""
+    key = key.lower()
+    if _filter_automaton is not None:
+        return next(_filter_automaton.iter(key), None) is not None
+    return _filter_re.search(key) is not None
+
+
 def filtered_value(key, value):
     """Find and mask sensitive values based on key names."""
-    if isinstance(key, str) and _filter_re.search(key):
+    if isinstance(key, str) and _is_sensitive_key(key):
         return filtered_value_indicator
-    if isinstance(value, str):
+    # Strings too short to hold a card number are returned without a regex scan
+    if isinstance(value, str) and len(value) >= _card_min_length:
         return _card_re.sub('[Filtered]', value)
     return value
 
 
+def filtered_repr(key, value):
+    """
+    Return a repr of the filtered value, without raising exceptions.
+
+    If the value's own repr fails, the default :meth:`object.__repr__` is used
+    instead, as it can't be overridden and won't reveal the value's contents.
+    """
+    try:
+        return repr(filtered_value(key, value))
+    except Exception:  # noqa: B902
+        pass
+    try:
+        return object.__repr__(value)
+    except Exception:  # noqa: B902
+        return "<ERROR WHILE PRINTING VALUE>"
+
+
+class IndentedWriter:
+    """Wrap a file-like object to indent every line written to it."""
+
+    def __init__(self, outfile, indent=4):
+        """Init with file and indent."""
+        self.outfile = outfile
+        self.prefix = ' ' * indent
+        self.at_line_start = True
+
+    def write(self, text):
+        """Write text, indenting each new line."""
+        if not text:
+            return
+        if self.at_line_start:
+            text = self.prefix + text
+        self.at_line_start = text[-1] == '\n'
+        if self.at_line_start:
+            text = text[:-1].replace('\n', '\n' + self.prefix) + '\n'
+        else:
+            text = text.replace('\n', '\n' + self.prefix)
+        self.outfile.write(text)
+
+
 def pprint_with_indent(dictlike, outfile, indent=4):
     """Filter values and pprint with indent to create a Markdown code block."""
-    out = StringIO()
-    pprint(  # noqa: T003
-        {key: filtered_value(key, value) for key, value in dictlike.items()}, out
+    PrettyPrinter(stream=IndentedWriter(outfile, indent)).pprint(
+        {key: filtered_value(key, value) for key, value in dictlike.items()}
     )
-    outfile.write(textwrap.indent(out.getvalue(), ' ' * indent))
-    out.close()
+
+
+def _filtered_config_repr(self):
+    """Replacement for :meth:`flask.Config.__repr__` that hides config values."""
+    return '<Config [FILTERED]>'
 
 
 class LocalVarFormatter(logging.Formatter):
-    """Log the contents of local variables in the stack frame."""
+    """
+    Log the contents of local variables in the stack frame.
+
+    Creating this formatter replaces the ``__repr__`` of Flask's
+    :class:`~flask.Config` for the whole process, so that stack dumps don't reveal
+    sensitive config. Config appears in the stack when a Jinja2 template is being
+    rendered, as templates get app config. Patching once here instead of around each
+    stack dump avoids a lock that would serialize error logging across threads.
+    """
 
     def __init__(self, *args, **kwargs):
         """Init formatter."""
         super().__init__(*args, **kwargs)
-        self.lock = Lock()
+        Config.__repr__ = _filtered_config_repr  # type: ignore[assignment]
 
     def format(self, record):  # noqa: A003
         """
@@ -144,46 +255,35 @@ class LocalVarFormatter(logging.Formatter):
         sio = StringIO()
         traceback.print_exception(ei[0], ei[1], ei[2], None, sio)
 
-        with self.lock:
-            # Monkey-patch Flask Config's __repr__ to not dump sensitive config. This
-            # can happen when a Jinja2 template is part of the stack, as templates get
-            # app config. We perform this patch and dump within a lock to ensure no
-            # conflict with a parallel stack dump -- which could otherwise restore the
-            # original __repr__ while this is still dumping.
-            original_config_repr = Config.__repr__
-            Config.__repr__ = lambda self: '<Config [FILTERED]>'  # type: ignore[assignment]
-            value_cache: Dict[Any, str] = {}
-
-            print('\n----------\n', file=sio)  # noqa: T001
-            # XXX: The following text is used as a signature in :meth:`format` above
-            print("Stack frames (most recent call first):", file=sio)  # noqa: T001
-            for frame in stack:
-                print('\n----\n', file=sio)  # noqa: T001
-                print(  # noqa: T001
-                    f"Frame {frame.f_code.co_name} in {frame.f_code.co_filename} at"
-                    f" line {frame.f_lineno}",
-                    file=sio,
-                )
-                for attr, value in list(frame.f_locals.items()):
-                    idvalue = id(value)
-                    if idvalue in value_cache:
-                        value = RepeatValueIndicator(value_cache[idvalue])
-                    else:
-                        value_cache[idvalue] = f"{frame.f_code.co_name}.{attr}"
-                    print(f"\t{attr:>20} = ", end=' ', file=sio)  # noqa: T001
-                    try:
-                        print(repr(filtered_value(attr, value)), file=sio)  # noqa: T001
-                    except:  # noqa: B901, E722
-                        # We need a bare except clause because this is the exception
-                        # handler. It can't have exceptions of its own.
-                        print("<ERROR WHILE PRINTING VALUE>", file=sio)  # noqa: T001
-
-            del value_cache
-            Config.__repr__ = original_config_repr  # type: ignore[assignment]
+        value_cache: Dict[Any, str] = {}
+
+        sio.write('\n----------\n\n')
+        # XXX: The following text is used as a signature in :meth:`format` above
+        sio.write("Stack frames (most recent call first):\n")
+        for frame in stack:
+            sio.write('\n----\n\n')
+            sio.write(
+                f"Frame {frame.f_code.co_name} in {frame.f_code.co_filename} at"
+                f" line {frame.f_lineno}\n"
+            )
+            frame_locals = frame.f_locals.items()
+            if not frame.f_code.co_flags & CO_OPTIMIZED:
+                # Only function frames have a private snapshot of locals. Module
+                # and class namespaces are shared and may change as we iterate
+                frame_locals = list(frame_locals)
+            for attr, value in frame_locals:
+                idvalue = id(value)
+                if idvalue in value_cache:
+                    value = RepeatValueIndicator(value_cache[idvalue])
+                else:
+                    value_cache[idvalue] = f"{frame.f_code.co_name}.{attr}"
+                sio.write(f"\t{attr:>20} =  {filtered_repr(attr, value)}\n")
+
+        del value_cache
 
         if request:
-            print('\n----------\n', file=sio)  # noqa: T001
-            print("Request context:", file=sio)  # noqa: T001
+            sio.write('\n----------\n\n')
+            sio.write("Request context:\n")
             request_data = {
                 'form': {
                     k: filtered_value(k, v)
@@ -202,32 +302,32 @@ class LocalVarFormatter(logging.Formatter):
             }
             try:
                 pprint_with_indent(request_data, sio)
-            except:  # noqa: B901, E722
-                print("<ERROR WHILE PRINTING VALUE>", file=sio)  # noqa: T001
+            except Exception:  # noqa: B902
+                sio.write("<ERROR WHILE PRINTING VALUE>\n")
 
         if session:
-            print('\n----------\n', file=sio)  # noqa: T001
-            print("Session cookie contents:", file=sio)  # noqa: T001
+            sio.write('\n----------\n\n')
+            sio.write("Session cookie contents:\n")
             try:
                 pprint_with_indent(session, sio)
-            except:  # noqa: B901, E722
-                print("<ERROR WHILE PRINTING VALUE>", file=sio)  # noqa: T001
+            except Exception:  # noqa: B902
+                sio.write("<ERROR WHILE PRINTING VALUE>\n")
 
         if g:
-            print('\n----------\n', file=sio)  # noqa: T001
-            print("App context:", file=sio)  # noqa: T001
+            sio.write('\n----------\n\n')
+            sio.write("App context:\n")
             try:
                 pprint_with_indent(vars(g), sio)
-            except:  # noqa: B901, E722
-                print("<ERROR WHILE PRINTING VALUE>", file=sio)  # noqa: T001
+            except Exception:  # noqa: B902
+                sio.write("<ERROR WHILE PRINTING VALUE>\n")
 
         if current_auth:
-            print('\n----------\n', file=sio)  # noqa: T001
-            print("Current auth:", file=sio)  # noqa: T001
+            sio.write('\n----------\n\n')
+            sio.write("Current auth:\n")
             try:
                 pprint_with_indent(vars(current_auth), sio)
-            except:  # noqa: B901, E722
-                print("<ERROR WHILE PRINTING VALUE>", file=sio)  # noqa: T001
+            except Exception:  # noqa: B902
+                sio.write("<ERROR WHILE PRINTING VALUE>\n")
 
         s = sio.getvalue()
         sio.close()
@@ -244,33 +344,43 @@ class SlackHandler(logging.Handler):
         super().__init__()
         self.app_name = app_name
         self.webhooks = webhooks
+        # Precompute each webhook's levels and payload overrides, and the union of
+        # all levels, so that emit doesn't rebuild them for every record
+        self._webhook_levels = [
+            frozenset(webhook.get('levelnames', [])) for webhook in webhooks
+        ]
+        self._webhook_overrides = [
+            {
+                attr: webhook[attr]
+                for attr in ('channel', 'username', 'icon_emoji')
+                if attr in webhook
+            }
+            for webhook in webhooks
+        ]
+        self._levelnames = frozenset().union(*self._webhook_levels)
 
     def emit(self, record):
         """Emit an event."""
         throttle_key = (record.module, record.lineno)
-        if throttle_key not in error_throttle_timestamp_slack or (
-            (datetime.utcnow() - error_throttle_timestamp_slack[throttle_key])
-            > timedelta(minutes=5)
+        if (
+            time.monotonic()
+            - error_throttle_timestamp_slack.get(throttle_key, float('-inf'))
+            > error_throttle_interval
         ):
 
             # Sanity check:
             # If we're not going to be reporting this, don't bother to format payload
-            if record.levelname not in [
-                lname
-                for webhook in self.webhooks
-                for lname in webhook.get('levelnames', [])
-            ]:
+            if record.levelname not in self._levelnames:
                 return
             if record.exc_text:
-                double_split = [
-                    s.split('----') for s in record.exc_text.split('----------')
-                ]
-                flat_list = [item for sublist in double_split for item in sublist]
                 # Separate out the first line of each section. It'll be used as the
                 # "pretext" while the rest will be used as a "text" attachment.
-                sections = [s.strip().split('\n', 1) for s in flat_list]
+                sections = (
+                    s.strip().split('\n', 1)
+                    for s in _slack_section_re.split(record.exc_text)
+                )
             else:
-                sections = []
+                sections = ()
 
             data = {
                 'text': "*{levelname}* in {name}: {message}: `{info}`".format(
@@ -292,25 +402,25 @@ class SlackHandler(logging.Handler):
                 ],
             }
 
-            for webhook in self.webhooks:
-                if record.levelname not in webhook.get('levelnames', []):
+            for webhook, levelnames, overrides in zip(
+                self.webhooks, self._webhook_levels, self._webhook_overrides
+            ):
+                if record.levelname not in levelnames:
                     continue
-                payload = dict(data)
-                for attr in ('channel', 'username', 'icon_emoji'):
-                    if attr in webhook:
-                        payload[attr] = webhook[attr]
+                payload = {**data, **overrides}
 
                 try:
-                    requests.post(
+                    _http.post(
                         webhook['url'],
-                        json=payload,
+                        data=_json_dumps(payload),
                         headers={'Content-Type': 'application/json'},
+                        timeout=_http_timeout,
                     )
                 except:  # NOQA  # nosec
                     # We need a bare except clause because this is the exception
                     # handler. It can't have exceptions of its own.
                     pass
-                error_throttle_timestamp_slack[throttle_key] = datetime.utcnow()
+                error_throttle_timestamp_slack[throttle_key] = time.monotonic()
 
 
 class TelegramHandler(logging.Handler):
@@ -323,52 +433,69 @@ class TelegramHandler(logging.Handler):
         self.chatid = chatid
         self.apikey = apikey
 
+    @staticmethod
+    def _format_stack_frame(stack_frame):
+        """Render a stack frame as HTML, with the source line in a pre block."""
+        heading, _sep, source = stack_frame.partition('\n')
+        heading = heading.strip().translate(_html_escape_table)
+        if source:
+            source = source.strip().translate(_html_escape_table)
+            return f'{heading}\n<pre>{source}</pre>\n'
+        return f'{heading}\n'
+
     def emit(self, record):
         """Emit an event."""
         throttle_key = (record.module, record.lineno)
-        if throttle_key not in error_throttle_timestamp_telegram or (
-            (datetime.utcnow() - error_throttle_timestamp_telegram[throttle_key])
-            > timedelta(minutes=5)
+        if (
+            time.monotonic()
+            - error_throttle_timestamp_telegram.get(throttle_key, float('-inf'))
+            > error_throttle_interval
         ):
             text = '<b>{levelname}</b> in <b>{name}</b>: {message}'.format(
-                levelname=escape(record.levelname, False),
-                name=escape(self.app_name, False),
-                message=escape(record.message, False),
+                levelname=record.levelname.translate(_html_escape_table),
+                name=self.app_name.translate(_html_escape_table),
+                message=record.message.translate(_html_escape_table),
             )
             if record.exc_info:
                 # Reverse the traceback, after dropping the first line with
-                # "Traceback (most recent call first)".
-                traceback_lines = traceback.format_exception(*record.exc_info)[1:][::-1]
-                for index, stack_frame in enumerate(traceback_lines):
-                    stack_frame_lines = stack_frame.split('\n', 1)
-                    traceback_lines[index] = (
-                        '\n'.join(
-                            [escape(stack_frame_lines[0].strip(), False)]
-                            + [
-                                '<pre>' + escape(_l.strip(), False) + '</pre>'
-                                for _l in stack_frame_lines[1:]
-                                if _l
-                            ]
-                        )
-                        + '\n'
+                # "Traceback (most recent call first)". Iterate in place instead
+                # of making sliced and reversed copies of the list
+                traceback_lines = traceback.format_exception(*record.exc_info)
+                text += '\n\n' + '\n'.join(
+                    self._format_stack_frame(stack_frame)
+                    for stack_frame in islice(
+                        reversed(traceback_lines), len(traceback_lines) - 1
                     )
-                text += '\n\n' + '\n'.join(traceback_lines)
+                )
             if len(text) > 4096:
                 text = text[: 4096 - 7]  # 7 = len('</pre>…')
                 if text.count('<pre>') > text.count('</pre>'):
                     text += '</pre>'
                 text += '…'
 
-            requests.post(
-                f'https://api.telegram.org/bot{self.apikey}/sendMessage',
-                data={
-                    'chat_id': self.chatid,
-                    'parse_mode': 'html',
-                    'text': text,
-                    'disable_preview': True,
-                },
-            )
-            error_throttle_timestamp_telegram[throttle_key] = datetime.utcnow()
+            try:
+                _http.post(
+                    f'https://api.telegram.org/bot{self.apikey}/sendMessage',
+                    data={
+                        'chat_id': self.chatid,
+                        'parse_mode': 'html',
+                        'text': text,
+                        'disable_preview': True,
+                    },
+                    timeout=_http_timeout,
+                )
+            except:  # NOQA  # nosec
+                # We need a bare except clause because this is the exception
+                # handler. It can't have exceptions of its own.
+                pass
+            error_throttle_timestamp_telegram[throttle_key] = time.monotonic()
+
+
+def _is_coaster_handler(handler):
+    """Check if a log handler was added by :func:`init_app`."""
+    return isinstance(handler, (SlackHandler, TelegramHandler)) or isinstance(
+        handler.formatter, LocalVarFormatter
+    )
 
 
 def init_app(app):
@@ -397,8 +524,17 @@ def init_app(app):
             'url': 'https://hooks.slack.com/...'
             }]
 
+    Note that :class:`LocalVarFormatter` replaces the ``__repr__`` of Flask's
+    :class:`~flask.Config` for the whole process, to hide config values.
+
+    Handlers are added to ``app.logger``, which is shared by all apps with the same
+    name. If that logger already has handlers from this function, calling it again
+    (for the same app or another app with the same name) does nothing, as duplicate
+    handlers would format and report every log record more than once.
     """
     logger = app.logger  # logging.getLogger()
+    if any(_is_coaster_handler(handler) for handler in logger.handlers):
+        return
 
     formatter = LocalVarFormatter(
         '%(asctime)s - %(module)s.%(funcName)s:%(lineno)s - %(levelname)s - %(message)s'
@@ -18,6 +18,8 @@ __all__ = ['JsonDict', 'UUIDType', 'UrlType']
 class JsonType(UserDefinedType):
     """The PostgreSQL JSON type."""
 
+    cache_ok = True
+
     def get_col_spec(self):
         return 'JSON'
 
@@ -25,6 +27,8 @@ class JsonType(UserDefinedType):
 class JsonbType(UserDefinedType):
     """The PostgreSQL JSONB type."""
 
+    cache_ok = True
+
     def get_col_spec(self):
         return 'JSONB'
 
@@ -46,6 +50,7 @@ class JsonDict(TypeDecorator):
     """
 
     impl = TEXT
+    cache_ok = True
 
     def load_dialect_impl(self, dialect):
         if dialect.name == 'postgresql':
@@ -111,7 +116,7 @@ class UrlType(UrlTypeBase):
     .. _URLType: https://sqlalchemy-utils.readthedocs.io/en/latest/data_types.html#module-sqlalchemy_utils.types.url
 
     :param schemes: Valid URL schemes. Use `None` to allow any scheme,
-        `()` for no scheme
+        `()` for no scheme. A single scheme may be given as a string
     :param optional_scheme: Schemes are optional (allows URLs starting with ``//``)
     :param optional_host: Allow URLs without a hostname (required for ``mailto`` and
         ``file`` schemes)
@@ -119,12 +124,16 @@ class UrlType(UrlTypeBase):
 
     impl = UnicodeText
     url_parser = furl
+    cache_ok = True
 
     def __init__(
         self, schemes=('http', 'https'), optional_scheme=False, optional_host=False
     ):
         super().__init__()
-        self.schemes = schemes
+        if isinstance(schemes, str):
+            schemes = (schemes,)
+        # A frozenset is hashable for SQLAlchemy's statement cache key
+        self.schemes = frozenset(schemes) if schemes is not None else None
         self.optional_host = optional_host
         self.optional_scheme = optional_scheme
 
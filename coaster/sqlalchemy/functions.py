@@ -25,6 +25,7 @@ __all__ = [
 # #utc-timestamp-function
 class utcnow(functions.GenericFunction):  # noqa: N801
     type = TIMESTAMP()  # noqa: A003
+    inherit_cache = True
 
 
 @compiles(utcnow)
@@ -32,6 +33,13 @@ def _utcnow_default(element, compiler, **kw):
     return 'CURRENT_TIMESTAMP'
 
 
+@compiles(utcnow, 'sqlite')
+def _utcnow_sqlite(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is only accurate to the second. Use its millisecond
+    # timestamp instead, padded to the microseconds that SQLAlchemy stores
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
 @compiles(utcnow, 'mysql')
 def _utcnow_mysql(element, compiler, **kw):  # pragma: no cover
     return 'UTC_TIMESTAMP()'
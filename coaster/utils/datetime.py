@@ -4,6 +4,8 @@ Date, time and timezone utilities
 """
 
 from datetime import datetime
+from functools import lru_cache
+import re
 
 from aniso8601 import parse_datetime, parse_duration
 from aniso8601.exceptions import ISOFormatError as ParseError
@@ -27,6 +29,22 @@ __all__ = [
 # https://stackoverflow.com/q/16309650/78903
 datetime.strptime('20160816', '%Y%m%d')
 
+# Cached wrapper for :func:`pytz.timezone`, which otherwise normalizes the zone name
+# and checks its own cache on every call. Names come from callers and pytz matches
+# them case-insensitively, so each spelling gets its own entry. The bound leaves room
+# for every zone pytz knows (about 600) without letting callers grow it forever
+_timezone = lru_cache(maxsize=1024)(pytz.timezone)
+
+# Timestamps that :func:`parse_isoformat` can hand to :meth:`datetime.fromisoformat`.
+# Hour 24 and a ``-00:00`` offset are left to aniso8601, which treats them
+# differently, as is any offset with seconds
+_isoformat_re = re.compile(
+    r'\d{4}-\d{2}-\d{2}(?P<delimiter>.)'  # Date and delimiter
+    r'(?:[01]\d|2[0-3]):[0-5]\d:[0-5]\d(?:\.\d{1,6})?'  # Time
+    r'(?P<tz>Z|[+-](?!00:00)(?:[01]\d|2[0-3]):[0-5]\d|\+00:00)?',  # Offset
+    re.ASCII,
+)
+
 
 def utcnow():
     """Return the current time at UTC with `tzinfo` set."""
@@ -42,15 +60,36 @@ def parse_isoformat(text, naive=True, delimiter='T'):
 
     :param bool naive: If `True`, strips timezone and returns datetime at UTC.
     """
+    dt = None
+    # Fast path for the ``YYYY-MM-DDTHH:MM:SS[.ffffff][+HH:MM]`` format produced by
+    # :meth:`datetime.isoformat`, using Python's C parser. The pattern is limited
+    # to input that aniso8601 parses the same way. Aware timestamps only take this
+    # path when ``naive`` is set, as aniso8601 returns its own tzinfo class
+    match = _isoformat_re.fullmatch(text)
+    if (
+        match is not None
+        and match['delimiter'] == delimiter
+        and (naive or match['tz'] is None)
+    ):
+        try:
+            dt = datetime.fromisoformat(text[:10] + 'T' + text[11:])
+        except ValueError:
+            pass
+    if dt is None:
+        dt = _parse_datetime(text, delimiter)
+    if dt.tzinfo is not None and naive:
+        dt = dt.astimezone(pytz.UTC).replace(tzinfo=None)
+    return dt
+
+
+def _parse_datetime(text, delimiter):
+    """Parse an ISO 8601 timestamp with aniso8601, raising :exc:`ParseError`."""
     try:
-        dt = parse_datetime(text, delimiter)
+        return parse_datetime(text, delimiter)
     except NotImplementedError:
         # aniso8601 misinterprets junk data and returns NotImplementedError with
         # "ISO 8601 extended year representation not supported"
         raise ParseError(f"Unparseable datetime {text}")
-    if dt.tzinfo is not None and naive:
-        dt = dt.astimezone(pytz.UTC).replace(tzinfo=None)
-    return dt
 
 
 def isoweek_datetime(year, week, timezone='UTC', naive=False):
@@ -70,7 +109,7 @@ def isoweek_datetime(year, week, timezone='UTC', naive=False):
     """
     naivedt = datetime.combine(isoweek.Week(year, week).day(0), datetime.min.time())
     if isinstance(timezone, str):
-        tz = pytz.timezone(timezone)
+        tz = _timezone(timezone)
     else:
         tz = timezone
     dt = tz.localize(naivedt).astimezone(pytz.UTC)
@@ -108,7 +147,7 @@ def midnight_to_utc(dt, timezone=None, naive=False):
     """
     if timezone:
         if isinstance(timezone, str):
-            tz = pytz.timezone(timezone)
+            tz = _timezone(timezone)
         else:
             tz = timezone
     elif isinstance(dt, datetime) and dt.tzinfo:
@@ -116,14 +155,28 @@ def midnight_to_utc(dt, timezone=None, naive=False):
     else:
         tz = pytz.UTC
 
-    utc_dt = tz.localize(datetime.combine(dt, datetime.min.time())).astimezone(pytz.UTC)
+    utc_dt = _midnight_to_utc(dt.year, dt.month, dt.day, tz)
     if naive:
         return utc_dt.replace(tzinfo=None)
     return utc_dt
 
 
+@lru_cache(maxsize=2048)
+def _midnight_to_utc(year, month, day, tz):
+    """Return midnight on the given day in the given timezone, as a UTC datetime."""
+    return tz.localize(datetime(year, month, day)).astimezone(pytz.UTC)
+
+
 def sorted_timezones():
     """Return a list of timezones sorted by offset from UTC."""
+    # Offsets only change with daylight saving, so a list computed once a day is
+    # reused. Return a copy so callers can't modify the cached list
+    return list(_sorted_timezones(datetime.utcnow().date()))
+
+
+@lru_cache(maxsize=2)
+def _sorted_timezones(today):
+    """Return a list of timezones sorted by offset from UTC as of the given date."""
 
     def hourmin(delta):
         if delta.days < 0:
@@ -133,46 +186,50 @@ def sorted_timezones():
         minutes, remaining = divmod(remaining, 60)
         return hours, minutes
 
-    now = datetime.utcnow()
+    now = datetime.combine(today, datetime.min.time())
+    country_names = pytz.country_names
+    country_timezones = pytz.country_timezones
     # Make a list of country code mappings
     timezone_country = {}
-    for countrycode in pytz.country_timezones:
-        for timezone in pytz.country_timezones[countrycode]:
+    for countrycode in country_timezones:
+        for timezone in country_timezones[countrycode]:
             timezone_country[timezone] = countrycode
 
     # Make a list of timezones, discarding the US/* and Canada/* zones since they aren't
     # reliable for DST, and discarding UTC and GMT since timezones in that zone have
     # their own names
     timezones = [
-        (pytz.timezone(tzname).utcoffset(now, is_dst=False), tzname)
+        (_timezone(tzname), tzname)
         for tzname in pytz.common_timezones
         if not tzname.startswith('US/')
         and not tzname.startswith('Canada/')
         and tzname not in ('GMT', 'UTC')
     ]
     # Sort timezones by offset from UTC and their human-readable name
-    presorted = [
-        (
-            delta,
-            '{sign}{offset} – {country}{zone} ({tzname})'.format(
-                sign=(
-                    (delta.days < 0 and '-')
-                    or (delta.days == 0 and delta.seconds == 0 and ' ')
-                    or '+'
+    presorted = []
+    for tz, name in timezones:
+        delta = tz.utcoffset(now, is_dst=False)
+        presorted.append(
+            (
+                delta,
+                '{sign}{offset} – {country}{zone} ({tzname})'.format(
+                    sign=(
+                        (delta.days < 0 and '-')
+                        or (delta.days == 0 and delta.seconds == 0 and ' ')
+                        or '+'
+                    ),
+                    offset='{:02d}:{:02d}'.format(*hourmin(delta)),
+                    country=(
+                        (f'{country_names[timezone_country[name]]}: ')
+                        if name in timezone_country
+                        else ''
+                    ),
+                    zone=name.replace('_', ' '),
+                    tzname=tz.tzname(now, is_dst=False),
                 ),
-                offset='{:02d}:{:02d}'.format(*hourmin(delta)),
-                country=(
-                    (f'{pytz.country_names[timezone_country[name]]}: ')
-                    if name in timezone_country
-                    else ''
-                ),
-                zone=name.replace('_', ' '),
-                tzname=pytz.timezone(name).tzname(now, is_dst=False),
-            ),
-            name,
+                name,
+            )
         )
-        for delta, name in timezones
-    ]
     presorted.sort()
     # Return a list of (timezone, label) with the timezone offset included in the label.
     return [(name, label) for (delta, label, name) in presorted]
@@ -52,6 +52,22 @@ class TestCoasterApp(unittest.TestCase):
                 if isinstance(formatter, LocalVarFormatter):
                     formatter.formatException(sys.exc_info())
 
+    def test_logging_init_app_once(self):
+        load_config_from_file(self.another_app, "testing.py")
+        logger_init_app(self.another_app)
+        handlers = list(self.another_app.logger.handlers)
+        assert handlers
+        # Calling init_app again does not add duplicate handlers
+        logger_init_app(self.another_app)
+        assert self.another_app.logger.handlers == handlers
+        # Apps with the same name share a logger, so another instance doesn't add
+        # handlers either
+        same_name_app = Flask(self.another_app.name)
+        load_config_from_file(same_name_app, "testing.py")
+        assert same_name_app.logger is self.another_app.logger
+        logger_init_app(same_name_app)
+        assert same_name_app.logger.handlers == handlers
+
     def test_load_config_from_file_ioerror(self):
         app = Flask(__name__)
         assert not load_config_from_file(app, "notfound.py")
@@ -1,6 +1,15 @@
 from io import StringIO
+import re
 
-from coaster.logger import RepeatValueIndicator, filtered_value, pprint_with_indent
+from coaster.logger import (
+    IndentedWriter,
+    RepeatValueIndicator,
+    _filter_automaton,
+    _filter_re,
+    filtered_repr,
+    filtered_value,
+    pprint_with_indent,
+)
 
 
 def test_filtered_value():
@@ -15,7 +24,7 @@ def test_filtered_value():
     assert str(filtered_value('password', '123pass')) == '[Filtered]'
     # Also works on partial matches in the keys
     assert repr(filtered_value('confirm_password', '123pass')) == '[Filtered]'
-    # The filter uses a verbose regex. Words in the middle of the regex also work
+    # Words in the middle of the keyword list also work
     assert repr(filtered_value('access_token', 'secret-here')) == '[Filtered]'
     # Filters are case insensitive
     assert repr(filtered_value('TELEGRAM_ERROR_APIKEY', 'api:key')) == '[Filtered]'
@@ -32,6 +41,46 @@ def test_filtered_value():
         filtered_value('anything', 'My number is 1234  5678-90123456')
         == 'My number is [Filtered]'
     )
+    # Numbers too short to be card numbers are left alone
+    assert filtered_value('anything', '123456789012') == '123456789012'
+    assert filtered_value('anything', '1234567890123') == '[Filtered]'
+    # Digits and word boundaries are Unicode-aware, in any script
+    assert filtered_value('anything', '१२३४५६७८९०१२३४५६') == '[Filtered]'
+    assert filtered_value('anything', '１２３４５６７８９０１２３４５６') == '[Filtered]'
+    assert filtered_value('anything', 'é1234567890123') == 'é1234567890123'
+
+
+def test_filter_keyword_engines():
+    """Sensitive keys match the same with every available keyword matcher."""
+    matchers = [_filter_re.search, re.compile(_filter_re.pattern).search]
+    if _filter_automaton is not None:
+        matchers.append(lambda key: next(_filter_automaton.iter(key), None))
+    for key in (
+        'password',
+        'confirm_password',
+        'telegram_error_apikey',
+        'sms_twilio_token',
+        'token_expiry',
+        'émail',
+        'normal',
+        'tokenize',
+        'pässword',
+    ):
+        assert len({matcher(key) is not None for matcher in matchers}) == 1, key
+
+
+def test_filtered_repr():
+    """Test filtered_repr filters values and survives a broken __repr__."""
+
+    class BrokenRepr:
+        def __repr__(self):
+            raise RuntimeError("Broken")
+
+    assert filtered_repr('normal', 'value') == "'value'"
+    assert filtered_repr('password', '123pass') == '[Filtered]'
+    assert filtered_repr('normal', BrokenRepr()).startswith(
+        '<tests.test_logger.test_filtered_repr.<locals>.BrokenRepr object at 0x'
+    )
 
 
 def test_pprint_with_indent():
@@ -59,6 +108,17 @@ def test_pprint_with_indent():
     )
 
 
+def test_indented_writer():
+    """Test IndentedWriter indents lines split across multiple writes."""
+    out = StringIO()
+    writer = IndentedWriter(out, 2)
+    writer.write('first')
+    writer.write(' line\nsecond line\n')
+    writer.write('')
+    writer.write('third\nfourth\n')
+    assert out.getvalue() == '  first line\n  second line\n  third\n  fourth\n'
+
+
 def test_repeat_value_indicator():
     """Test RepeatValueIndicator class."""
     assert repr(RepeatValueIndicator('key')) == "<same as prior 'key'>"
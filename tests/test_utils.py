@@ -128,6 +128,39 @@ class TestCoasterUtils(unittest.TestCase):
                 '||CHR(107)||CHR(107)||CHR(113)) AS NUMERIC) AND (2521=2521'
             )
 
+    def test_parse_isoformat_fast_path(self):
+        # Common isoformat() output parses the same in both naive modes, returning
+        # the same tzinfo class for aware timestamps as other formats do
+        assert parse_isoformat('2019-05-03T05:02:26.340937') == datetime.datetime(
+            2019, 5, 3, 5, 2, 26, 340937
+        )
+        assert parse_isoformat(
+            '2019-05-03T05:02:26.5', naive=False
+        ) == datetime.datetime(2019, 5, 3, 5, 2, 26, 500000)
+        assert parse_isoformat(
+            '2019-05-03 05:02:26', delimiter=' '
+        ) == datetime.datetime(2019, 5, 3, 5, 2, 26)
+        assert parse_isoformat('2019-05-03T05:02:26+05:30') == datetime.datetime(
+            2019, 5, 2, 23, 32, 26
+        )
+        assert parse_isoformat('2019-05-03T05:02:26.5-06:39') == datetime.datetime(
+            2019, 5, 3, 11, 41, 26, 500000
+        )
+        aware = parse_isoformat('2019-05-03T05:02:26+05:30', naive=False)
+        assert aware == datetime.datetime(2019, 5, 2, 23, 32, 26, tzinfo=UTC)
+        assert type(aware.tzinfo) is type(
+            parse_isoformat('2019-05-03T05:02+05:30', naive=False).tzinfo
+        )
+
+        # Offsets that aniso8601 rejects are still rejected
+        for text in ('2019-05-03T05:02:26.5-00:00', '2019-05-03T05:02:26+05:30:15'):
+            for naive in (True, False):
+                with pytest.raises(ParseError):
+                    parse_isoformat(text, naive=naive)
+        # The delimiter must be the one specified
+        with pytest.raises(ParseError):
+            parse_isoformat('2019-05-03T05:02:26', delimiter=' ')
+
     def test_parse_duration(self):
         assert parse_duration('P1Y2M3DT4H54M6S') == datetime.timedelta(
             days=428, seconds=17646
@@ -213,6 +246,12 @@ class TestCoasterUtils(unittest.TestCase):
                     datetime.date(2017, 1, 1) + datetime.timedelta(days=day), timezone
                 )
 
+    def test_midnight_to_utc_timezone_name_case(self):
+        """Test that midnight_to_utc accepts timezone names in any case"""
+        expected = datetime.datetime(2017, 1, 1, 18, 30, tzinfo=UTC)
+        for timezone in ('Asia/Kolkata', 'asia/kolkata', 'ASIA/KOLKATA'):
+            assert midnight_to_utc(datetime.date(2017, 1, 2), timezone) == expected
+
     def test_utcnow(self):
         """Test that Coaster's utcnow works correctly"""
         # Get date from function being tested